@@ -4,8 +4,9 @@ Media Servarr Sync
 Webhook receiver for Sonarr & Radarr that triggers targeted Plex folder scans.
 
 Logic:
-1. Webhooks are immediately placed in a deduplicated Queue.
-2. A background worker processes the queue after a configurable delay.
+1. Webhooks are immediately placed in a deduplicated per-section Queue.
+2. A bounded worker pool drains each section's queue (one job per section at
+   a time) after a configurable delay.
 3. (Optional) Rclone VFS cache is cleared/refreshed for the specific path
    when USE_RCLONE=true. Skip entirely if you don't use rclone.
 4. Plex is triggered to perform a partial scan with retries on timeout.
@@ -24,13 +25,17 @@ import logging
 import signal
 import sys
 import sqlite3
+import heapq
+import importlib.util
+import itertools
 import ipaddress
 import math
 import secrets as _secrets
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 from datetime import datetime, timezone
-from functools import wraps
+from functools import lru_cache, wraps
 from typing import Optional
 from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
@@ -40,23 +45,33 @@ from flask import Flask, request, jsonify, render_template, session, redirect, u
 from flask_wtf.csrf import CSRFProtect
 from dotenv import load_dotenv
 from plexapi.server import PlexServer
-from plexapi.base import MediaContainer
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# orjson is optional — a faster drop-in for json.loads when installed
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
 
 # ---------------------------------------------------------------------------
 # Timezone — resolved before logging so timestamps are correct from line 1
 # ---------------------------------------------------------------------------
 load_dotenv()
 
-def _resolve_tz() -> timezone:
+def _resolve_tz() -> tuple:
+    """Return (tzinfo, unknown_name). unknown_name is set when TZ could not be
+    resolved, so the warning can be logged once logging is configured."""
     tz_name = os.getenv("TZ", "").strip()
     if tz_name:
         try:
-            return ZoneInfo(tz_name)
+            return ZoneInfo(tz_name), ""
         except ZoneInfoNotFoundError:
-            print(f"WARNING: Unknown timezone '{tz_name}', falling back to UTC", flush=True)
-    return timezone.utc
+            return timezone.utc, tz_name
+    return timezone.utc, ""
 
-LOCAL_TZ = _resolve_tz()
+LOCAL_TZ, _UNKNOWN_TZ = _resolve_tz()
 
 
 def now_local() -> datetime:
@@ -80,9 +95,16 @@ _handler.setFormatter(_TZFormatter(
     fmt="%(asctime)s [%(levelname)s] %(message)s",
     datefmt="%Y-%m-%dT%H:%M:%S%z",
 ))
-logging.basicConfig(level=logging.INFO, handlers=[_handler])
+# LOG_LEVEL=WARNING silences per-task INFO lines; all log calls use %-style
+# arguments so suppressed messages are never formatted.
+_log_level = logging.getLevelName(os.getenv("LOG_LEVEL", "INFO").strip().upper())
+logging.basicConfig(level=_log_level if isinstance(_log_level, int) else logging.INFO,
+                    handlers=[_handler])
 log = logging.getLogger(__name__)
 
+if _UNKNOWN_TZ:
+    log.warning("Unknown timezone '%s', falling back to UTC", _UNKNOWN_TZ)
+
 app = Flask(__name__)
 csrf = CSRFProtect(app)
 
@@ -99,6 +121,13 @@ def _datetimeformat(ts):
 # Helpers
 # ---------------------------------------------------------------------------
 
+_DURATION_RE    = re.compile(r'^(\d+)([smhd])$')
+_DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+_TITLE_STRIP_RE = re.compile(r'\s*[\(\{\[].*')
+_EP_COUNT_RE    = re.compile(r'^(\d+) episodes?$')
+_EP_KEY_RE      = re.compile(r'[Ss](\d+)[Ee](\d+)')
+
+
 def parse_duration(duration_str) -> int:
     """Convert a duration string like '30s', '5m', '1h' to seconds."""
     if not duration_str:
@@ -106,40 +135,92 @@ def parse_duration(duration_str) -> int:
     s = str(duration_str).strip().lower()
     if s.isdigit():
         return int(s)
-    match = re.match(r'^(\d+)([smhd])$', s)
+    match = _DURATION_RE.match(s)
     if not match:
         return 0
     value, unit = match.groups()
-    multipliers = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
-    return int(value) * multipliers[unit]
+    return int(value) * _DURATION_UNITS[unit]
 
 
 def normalize_path(path: str, is_dir: bool = True) -> str:
     if not path or not isinstance(path, str):
         return ""
-    clean = path.strip().replace('\\', '/').rstrip('/')
+    # strip()/replace() return the same object when there is nothing to change,
+    # so an already-clean path is not copied until the trailing slash is added.
+    clean = path.strip().replace('\\', '/')
+    if clean.endswith('/'):
+        clean = clean.rstrip('/')
     return clean + '/' if is_dir else clean
 
 
-def parse_json_env(env_name: str) -> dict:
+class PathTrie:
+    """Prefix trie keyed on '/'-separated path segments.
+
+    longest_prefix() walks one node per segment, so lookup cost depends on the
+    path depth rather than the number of mappings. Prefixes only match on whole
+    segments: '/data/tv' matches '/data/tv/Show' but not '/data/tvshows'.
+    """
+    _END = None   # node key holding the (prefix, value) stored at that node
+
+    def __init__(self):
+        self._root: dict = {}
+
+    def insert(self, path: str, value):
+        node = self._root
+        for seg in path.split('/'):
+            node = node.setdefault(seg, {})
+        node[self._END] = (path, value)
+
+    def longest_prefix(self, path: str) -> Optional[tuple]:
+        """Return (matched_prefix, value) for the longest stored prefix of path, or None."""
+        node = self._root
+        best = None
+        for seg in path.split('/'):
+            node = node.get(seg)
+            if node is None:
+                break
+            best = node.get(self._END, best)
+        return best
+
+
+def parse_json_env(env_name: str) -> PathTrie:
+    """Parse a JSON path-prefix mapping from the environment into a PathTrie.
+
+    Keys are normalised and lower-cased; lookups must use lower-cased paths.
+    """
     raw = os.getenv(env_name, "{}").strip().strip("'")
+    trie = PathTrie()
     try:
-        data = json.loads(raw)
-        return {normalize_path(k, is_dir=False).lower(): v for k, v in data.items()}
+        data = _json_loads(raw)
+        for k, v in data.items():
+            trie.insert(normalize_path(k, is_dir=False).lower(), v)
     except Exception as exc:
         log.error("Failed to parse %s: %s", env_name, exc)
-        return {}
+    return trie
+
 
+@lru_cache(maxsize=1024)
+def _map_path(path: str, mapping: PathTrie, is_dir: bool) -> tuple:
+    """Return (normalised_input, mapped_result, matched) for apply_path_mapping.
 
-def apply_path_mapping(path: str, mapping: dict, label: str, is_dir: bool = True) -> str:
+    Memoised because the same show/movie path arrives many times during an
+    import burst. PathTrie hashes by identity and is never mutated after
+    startup, so it is safe to use as part of the cache key.
+    """
     orig = normalize_path(path, is_dir=False)
-    lower = orig.lower()
-    for prefix in sorted(mapping.keys(), key=len, reverse=True):
-        if lower.startswith(prefix):
-            result = normalize_path(str(mapping[prefix]) + orig[len(prefix):], is_dir=is_dir)
-            log.debug("[%s] Map: '%s' -> '%s'", label, orig, result)
-            return result
-    return normalize_path(orig, is_dir=is_dir)
+    match = mapping.longest_prefix(orig.lower())
+    if match:
+        prefix, target = match
+        return orig, normalize_path(str(target) + orig[len(prefix):], is_dir=is_dir), True
+    # orig is already normalised — only the trailing slash may be missing
+    return orig, (orig + '/' if is_dir and orig else orig), False
+
+
+def apply_path_mapping(path: str, mapping: PathTrie, label: str, is_dir: bool = True) -> str:
+    orig, result, matched = _map_path(path, mapping, is_dir)
+    if matched:
+        log.debug("[%s] Map: '%s' -> '%s'", label, orig, result)
+    return result
 
 
 # ---------------------------------------------------------------------------
@@ -150,10 +231,19 @@ PLEX_URL        = os.getenv("PLEX_URL", "http://127.0.0.1:32400").rstrip('/')
 PLEX_TOKEN      = os.getenv("PLEX_TOKEN", "")
 PLEX_TIMEOUT    = parse_duration(os.getenv("PLEX_TIMEOUT", "60")) or 60
 PORT            = int(os.getenv("PORT", "5000"))
+# Max folders queued or in progress; further webhooks get 503 so the arr retries
+QUEUE_MAX       = max(1, int(os.getenv("QUEUE_MAX", "1000")))
+# Max library sections processed concurrently by the sync pool
+SYNC_CONCURRENCY = max(1, int(os.getenv("SYNC_CONCURRENCY", "4")))
+# Waitress request threads — webhook bursts are received in parallel
+WEB_THREADS     = max(1, int(os.getenv("WEB_THREADS", "8")))
 WEBHOOK_DELAY   = parse_duration(os.getenv("WEBHOOK_DELAY", "30"))
 MINIMUM_AGE     = parse_duration(os.getenv("MINIMUM_AGE", "0"))
 HISTORY_DAYS    = int(os.getenv("HISTORY_DAYS", "7"))
 SYNC_COOLDOWN   = parse_duration(os.getenv("SYNC_COOLDOWN", "5m"))
+# After the partial scan, wait for the item to appear and run item.analyze().
+# Off by default — Plex analyzes newly added media during the scan itself.
+DEEP_ANALYZE    = os.getenv("DEEP_ANALYZE", "false").strip().lower() in ("1", "true", "yes")
 MANUAL_USER     = os.getenv("MANUAL_USER", "admin")
 MANUAL_PASS     = os.getenv("MANUAL_PASS", "password")
 # Used to sign session cookies — set a long random string in your .env
@@ -187,10 +277,22 @@ PLEX_IDENTIFIER           = os.getenv("PLEXAPI_HEADER_IDENTIFIER", "media-servar
 plexapi.X_PLEX_IDENTIFIER = PLEX_IDENTIFIER
 plexapi.X_PLEX_PRODUCT    = PLEX_IDENTIFIER
 
+# Prefix tries built once at startup — see PathTrie / parse_json_env
 PATH_REPLACEMENTS        = parse_json_env("PATH_REPLACEMENTS")
 RCLONE_PATH_REPLACEMENTS = parse_json_env("RCLONE_PATH_REPLACEMENTS")
 SECTION_MAPPING          = parse_json_env("SECTION_MAPPING")
 
+
+@lru_cache(maxsize=256)
+def section_for_folder(mapped_folder: str) -> Optional[str]:
+    """Return the Plex section ID for a mapped folder, or None if unmapped.
+
+    Cached because the same show/movie folder repeats across webhooks, which
+    saves lower-casing the full path and walking the trie each time.
+    """
+    match = SECTION_MAPPING.longest_prefix(mapped_folder.rstrip('/').lower())
+    return match[1] if match else None
+
 # Apply secret key now that config is loaded
 app.secret_key = SECRET_KEY
 
@@ -354,6 +456,19 @@ class SyncTask:
     custom_formats: str = ""   # JSON-encoded list of format name strings
     quality_profile: str = ""  # e.g. "HD-1080p" from Sonarr/Radarr quality profiles
     queued_at: float = field(default_factory=time.monotonic)
+    ready_at: float = 0.0      # monotonic time the task is due; set by _schedule_task
+    aged: bool = False         # MINIMUM_AGE already waited out (deferred once)
+    rclone_done: bool = False  # VFS already refreshed (possibly batched with another task)
+    # Derived once here rather than on every Plex lookup attempt
+    search_path: str = field(init=False, repr=False)   # mapped_folder without trailing slash
+    clean_title: str = field(init=False, repr=False)   # folder name minus "(year)"/"{tvdb-…}" tags
+
+    def __post_init__(self):
+        # SECTION_MAPPING values may be JSON ints; the journal returns TEXT.
+        # One key type keeps new and restored tasks on the same section queue.
+        self.section_id = str(self.section_id)
+        self.search_path = self.mapped_folder.rstrip('/')
+        self.clean_title = _TITLE_STRIP_RE.sub('', os.path.basename(self.search_path)).strip()
 
     def __eq__(self, other):
         return isinstance(other, SyncTask) and self.mapped_folder == other.mapped_folder
@@ -401,22 +516,28 @@ class SyncHistory:
             conn.commit()
 
     def add(self, entry: dict):
-        """Add a sync entry and prune old records."""
+        """Add a sync entry and prune old records.
+
+        If entry has no 'ts', it is derived from the same clock read as
+        created_at and the retention cutoff.
+        """
+        now = time.time()
+        ts = entry.get('ts') or datetime.fromtimestamp(now, tz=LOCAL_TZ).isoformat()
         with self._lock:
-            cutoff = time.time() - (self._retention_days * 86400)
+            cutoff = now - (self._retention_days * 86400)
             with sqlite3.connect(self._db_path) as conn:
                 conn.execute("""
                     INSERT INTO sync_history
                         (ts, label, path, status, error, duration_s, created_at, episode, quality, custom_formats, quality_profile)
                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 """, (
-                    entry['ts'],
+                    ts,
                     entry['label'],
                     entry['path'],
                     entry['status'],
                     entry.get('error', ''),
                     entry['duration_s'],
-                    time.time(),
+                    now,
                     entry.get('episode', ''),
                     entry.get('quality', ''),
                     entry.get('custom_formats', ''),
@@ -654,9 +775,98 @@ class InviteDB:
                 return [dict(r) for r in rows]
 
 
+class TaskStore:
+    """SQLite journal of queued sync tasks so pending scans survive a restart.
+
+    A row is written when a task is queued (and rewritten when a duplicate
+    webhook merges into it) and deleted once the worker has finished with it.
+    """
+
+    _FIELDS = ('mapped_folder', 'section_id', 'raw_path', 'rclone_host_path', 'age_check_path',
+               'label', 'episode', 'quality', 'custom_formats', 'quality_profile')
+
+    def __init__(self, db_path: str = "/data/queue.db"):
+        self._db_path = db_path
+        self._lock = threading.Lock()
+        self._init_db()
+
+    def _init_db(self):
+        os.makedirs(os.path.dirname(self._db_path), exist_ok=True)
+        with sqlite3.connect(self._db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    mapped_folder TEXT PRIMARY KEY,
+                    section_id TEXT NOT NULL,
+                    raw_path TEXT NOT NULL,
+                    rclone_host_path TEXT DEFAULT '',
+                    age_check_path TEXT DEFAULT '',
+                    label TEXT NOT NULL,
+                    episode TEXT DEFAULT '',
+                    quality TEXT DEFAULT '',
+                    custom_formats TEXT DEFAULT '',
+                    quality_profile TEXT DEFAULT '',
+                    enqueued_at INTEGER NOT NULL
+                )
+            """)
+            conn.commit()
+
+    def save(self, task: SyncTask):
+        """Insert or update the journal row for a queued task."""
+        values = [getattr(task, f) for f in self._FIELDS]
+        with self._lock:
+            with sqlite3.connect(self._db_path) as conn:
+                conn.execute(f"""
+                    INSERT OR REPLACE INTO tasks ({', '.join(self._FIELDS)}, enqueued_at)
+                    VALUES ({', '.join('?' * len(self._FIELDS))}, ?)
+                """, (*values, int(time.time())))
+                conn.commit()
+
+    def update(self, task: SyncTask):
+        """Rewrite the row for a still-journalled task; no-op once it was removed."""
+        values = [getattr(task, f) for f in self._FIELDS[1:]]
+        with self._lock:
+            with sqlite3.connect(self._db_path) as conn:
+                conn.execute(f"""
+                    UPDATE tasks SET {', '.join(f + ' = ?' for f in self._FIELDS[1:])}
+                    WHERE mapped_folder = ?
+                """, (*values, task.mapped_folder))
+                conn.commit()
+
+    def remove(self, mapped_folder: str):
+        with self._lock:
+            with sqlite3.connect(self._db_path) as conn:
+                conn.execute("DELETE FROM tasks WHERE mapped_folder = ?", (mapped_folder,))
+                conn.commit()
+
+    def load_all(self) -> list:
+        """Return all journalled tasks as dicts of SyncTask fields, oldest first."""
+        with self._lock:
+            with sqlite3.connect(self._db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                rows = conn.execute(
+                    f"SELECT {', '.join(self._FIELDS)} FROM tasks ORDER BY enqueued_at"
+                ).fetchall()
+                return [dict(r) for r in rows]
+
+
 history = SyncHistory(db_path="/data/sync_history.db", retention_days=HISTORY_DAYS)
 invite_db = InviteDB(db_path="/data/invites.db")
-sync_queue: queue.Queue = queue.Queue()
+task_store = TaskStore(db_path="/data/queue.db")
+# Delay queue — tasks wait here for WEBHOOK_DELAY (or MINIMUM_AGE) before
+# being handed to their section queue by _delay_dispatcher
+_delay_heap: list = []          # heap of (ready_at, seq, task); stale entries skipped on pop
+_delayed: dict = {}             # mapped_folder -> SyncTask currently in _delay_heap
+_delay_seq = itertools.count()  # tie-breaker so the heap never compares SyncTasks
+_delay_cond = threading.Condition()
+_section_queues: dict = {}      # section_id -> queue.Queue of tasks due for that section
+_draining: set = set()          # section_ids with a _drain_section job submitted/running
+_section_queues_lock = threading.Lock()
+# Shared pool for section drain jobs — bounds how many libraries scan at once
+_executor = ThreadPoolExecutor(max_workers=SYNC_CONCURRENCY, thread_name_prefix="sync")
+# Webhook ingest — arr API lookups for already-queued tasks, off the request
+# thread. Sized like the request pool so a slow arr API isn't a bottleneck.
+_ingest_executor = ThreadPoolExecutor(max_workers=WEB_THREADS, thread_name_prefix="ingest")
+_ingest_slots = threading.BoundedSemaphore(QUEUE_MAX)
 _in_flight: dict = {}           # mapped_folder -> SyncTask, currently queued or being processed
 _cooldown: dict = {}            # mapped_folder -> expiry monotonic timestamp, recently completed
 _in_flight_lock = threading.Lock()
@@ -672,12 +882,74 @@ _worker_alive = threading.Event()
 _worker_alive.set()
 
 
+def _sleep_while_alive(seconds: float) -> bool:
+    """Sleep up to seconds; return False early if shutdown begins meanwhile."""
+    deadline = time.monotonic() + seconds
+    while _worker_alive.is_set():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return True
+        time.sleep(min(remaining, 0.5))
+    return False
+
+
 # ---------------------------------------------------------------------------
 # Plex connection (lazy, with reconnect)
 # ---------------------------------------------------------------------------
 
 _plex: Optional[PlexServer] = None
 _plex_lock = threading.Lock()
+_section_cache: dict = {}       # section_id -> LibrarySection for the current connection
+_plex_wanted = threading.Event()  # set when _plex_connect_loop should (re)connect
+_plex_wanted.set()
+
+# Plex websocket alerts — used to wake metadata lookups as soon as Plex reports
+# that it has indexed something, instead of waiting out the full backoff.
+_HAS_WEBSOCKET = importlib.util.find_spec("websocket") is not None
+_alert_listener = None          # plexapi AlertListener thread for the current connection
+_scan_events: dict = {}         # str(section_id) -> Event, set on library alerts
+_scan_events_lock = threading.Lock()
+
+
+def scan_event(section_id) -> threading.Event:
+    """Return the Event set whenever Plex reports indexing activity in section_id."""
+    key = str(section_id)
+    with _scan_events_lock:
+        event = _scan_events.get(key)
+        if event is None:
+            event = _scan_events[key] = threading.Event()
+        return event
+
+
+def _on_plex_alert(data: dict):
+    """AlertListener callback: flag sections where Plex finished processing an
+    item (timeline state 5) or finished a library scan activity."""
+    sections = set()
+    if data.get('type') == 'timeline':
+        for entry in data.get('TimelineEntry', []):
+            if entry.get('identifier') == 'com.plexapp.plugins.library' and entry.get('state') == 5:
+                sections.add(str(entry.get('sectionID', '')))
+    elif data.get('type') == 'activity':
+        for note in data.get('ActivityNotification', []):
+            activity = note.get('Activity', {})
+            if note.get('event') == 'ended' and activity.get('type', '').startswith('library.update'):
+                sections.add(str(activity.get('Context', {}).get('librarySectionID', '')))
+    for section_id in sections:
+        if section_id:
+            scan_event(section_id).set()
+
+
+def _ensure_alert_listener():
+    """(Re)start the alert listener for the current connection. Must hold _plex_lock."""
+    global _alert_listener
+    if not DEEP_ANALYZE or not _HAS_WEBSOCKET or _plex is None:
+        return
+    if _alert_listener is not None and _alert_listener.is_alive():
+        return
+    try:
+        _alert_listener = _plex.startAlertListener(callback=_on_plex_alert)
+    except Exception as exc:
+        log.warning("Could not start Plex alert listener: %s", exc)
 
 
 def get_plex() -> Optional[PlexServer]:
@@ -689,14 +961,49 @@ def get_plex() -> Optional[PlexServer]:
                 log.info("Connected to Plex: %s (timeout=%ds)", _plex.friendlyName, PLEX_TIMEOUT)
             except Exception as exc:
                 log.error("Could not connect to Plex: %s", exc)
+                _plex_wanted.set()
+        _ensure_alert_listener()
         return _plex
 
 
 def invalidate_plex():
     """Force a reconnect on the next call."""
-    global _plex
+    global _plex, _alert_listener
     with _plex_lock:
         _plex = None
+        _section_cache.clear()
+        if _alert_listener is not None:
+            try:
+                _alert_listener.stop()
+            except Exception:
+                pass
+            _alert_listener = None
+    _plex_wanted.set()
+
+
+def _plex_connect_loop():
+    """Background thread: keep a Plex connection open so request handlers
+    (e.g. /health) never pay for connecting. Retries with backoff."""
+    delay = 5
+    while True:
+        _plex_wanted.wait()
+        _plex_wanted.clear()
+        if get_plex() is not None:
+            delay = 5
+            continue
+        _plex_wanted.set()
+        time.sleep(delay)
+        delay = min(delay * 2, 300)
+
+
+def get_section(plex_instance: PlexServer, section_id):
+    """Return the library section for section_id, fetched once per Plex connection."""
+    section = _section_cache.get(section_id)
+    if section is None:
+        # plexapi keys sections by int; SECTION_MAPPING values are usually strings
+        section = plex_instance.library.sectionByID(int(section_id))
+        _section_cache[section_id] = section
+    return section
 
 
 # ---------------------------------------------------------------------------
@@ -716,125 +1023,192 @@ def requires_auth(f):
 # Rclone
 # ---------------------------------------------------------------------------
 
-def rclone_vfs_refresh(host_path: str, label: str):
-    """Clear and async-refresh the rclone VFS cache for the given path.
-    No-op when USE_RCLONE is false."""
-    if not USE_RCLONE:
-        return
-    if not RCLONE_RC_URL:
-        log.warning("[%s] [RCLONE] USE_RCLONE=true but RCLONE_RC_URL is not set — skipping.", label)
-        return
+# Shared session so forget/refresh calls reuse a keep-alive connection to the
+# rclone RC daemon instead of opening a new one per request. Connection
+# failures are retried briefly; auth is set once here rather than per call.
+_rclone_session = requests.Session()
+_rclone_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16,
+                              max_retries=Retry(total=2, backoff_factor=0.2))
+_rclone_session.mount('http://', _rclone_adapter)
+_rclone_session.mount('https://', _rclone_adapter)
+if RCLONE_RC_USER:
+    _rclone_session.auth = (RCLONE_RC_USER, RCLONE_RC_PASS)
+
+
+# Upper bound on folders sent in one batched forget/refresh call
+_RCLONE_BATCH_MAX = 20
 
-    auth = (RCLONE_RC_USER, RCLONE_RC_PASS) if RCLONE_RC_USER else None
-    full = host_path.rstrip('/')
-    root = RCLONE_MOUNT_ROOT.rstrip('/')
 
+def _rclone_target(host_path: str, label: str) -> str:
+    """Translate a host path into a path relative to the rclone mount root."""
+    full = host_path.rstrip('/')
+    root = RCLONE_MOUNT_ROOT   # already stripped at config load
     if root and full.startswith(root):
-        target = full[len(root):].lstrip('/')
-    else:
-        target = full
-        if root:
-            log.warning("[%s] [RCLONE] Path '%s' is not under mount root '%s'", label, full, root)
+        return full[len(root):].lstrip('/')
+    if root:
+        log.warning("[%s] [RCLONE] Path '%s' is not under mount root '%s'", label, full, root)
+    return full
+
 
+def _rclone_forget_refresh(targets: list, label: str) -> bool:
+    """Forget + async-refresh targets in one RC call each. Returns True on success.
+
+    rclone accepts several directories per call as dir, dir2, dir3, ...
+    """
+    dirs = {("dir" if i == 0 else f"dir{i + 1}"): t for i, t in enumerate(targets)}
+    shown = ", ".join(f"'{t}'" for t in targets)
     try:
-        log.info("[%s] [RCLONE] Forget: '%s'", label, target)
-        requests.post(f"{RCLONE_RC_URL}/vfs/forget",
-                      json={"dir": target}, auth=auth, timeout=15)
-
-        log.info("[%s] [RCLONE] Refresh (async): '%s'", label, target)
-        res = requests.post(f"{RCLONE_RC_URL}/vfs/refresh",
-                            json={"dir": target, "recursive": True, "_async": True},
-                            auth=auth, timeout=15)
+        log.info("[%s] [RCLONE] Forget: %s", label, shown)
+        _rclone_session.post(f"{RCLONE_RC_URL}/vfs/forget",
+                             json=dirs, timeout=15)
+
+        log.info("[%s] [RCLONE] Refresh (async): %s", label, shown)
+        res = _rclone_session.post(f"{RCLONE_RC_URL}/vfs/refresh",
+                                   json={**dirs, "recursive": True, "_async": True},
+                                   timeout=15)
         if res.ok:
             log.info("[%s] [RCLONE] Queued job %s", label, res.json().get('jobid'))
-        else:
-            log.error("[%s] [RCLONE] Error %d: %s", label, res.status_code, res.text)
+            return True
+        log.error("[%s] [RCLONE] Error %d: %s", label, res.status_code, res.text)
     except requests.RequestException as exc:
         log.error("[%s] [RCLONE] Connection error: %s", label, exc)
+    return False
+
+
+def rclone_vfs_refresh(host_paths: list, label: str):
+    """Clear and async-refresh the rclone VFS cache for the given paths.
+
+    All paths are sent in a single batched call; if that fails, each path is
+    retried on its own so one bad directory can't block the rest.
+    No-op when USE_RCLONE is false."""
+    if not USE_RCLONE:
+        return
+    if not RCLONE_RC_URL:
+        log.warning("[%s] [RCLONE] USE_RCLONE=true but RCLONE_RC_URL is not set — skipping.", label)
+        return
+
+    # dict.fromkeys drops duplicate targets while keeping their order
+    targets = list(dict.fromkeys(_rclone_target(p, label) for p in host_paths if p))
+    if not targets:
+        return
+    if not _rclone_forget_refresh(targets, label) and len(targets) > 1:
+        log.warning("[%s] [RCLONE] Batched refresh failed, retrying %d paths individually",
+                    label, len(targets))
+        for target in targets:
+            _rclone_forget_refresh([target], label)
 
 
 # ---------------------------------------------------------------------------
 # Background worker
 # ---------------------------------------------------------------------------
 
-def sync_worker():
-    log.info("Sync worker started")
-    while _worker_alive.is_set():
-        try:
-            task: SyncTask = sync_queue.get(timeout=1)
-        except queue.Empty:
-            continue
+def _due_for_rclone(sync_queue: queue.Queue) -> list:
+    """Queued tasks (all already past their delay) that still need a VFS refresh."""
+    with sync_queue.mutex:
+        due = [t for t in sync_queue.queue if not t.rclone_done]
+    return due[:_RCLONE_BATCH_MAX - 1]
 
-        start = time.monotonic()
-        status = "ok"
-        error_msg = ""
 
-        try:
-            # Optional delay (e.g. wait for Sonarr to finish writing)
-            if WEBHOOK_DELAY > 0:
-                elapsed = time.monotonic() - task.queued_at
-                remaining = WEBHOOK_DELAY - elapsed
-                if remaining > 0:
-                    log.info("[%s] [DELAY] Waiting %.0fs before processing...", task.label, remaining)
-                    time.sleep(remaining)
-
-            # Rclone VFS cache
-            rclone_vfs_refresh(task.rclone_host_path, task.label)
-
-            # Minimum file age check
-            if MINIMUM_AGE > 0:
-                check = task.age_check_path.rstrip('/')
-                if os.path.exists(check):
-                    age = time.time() - os.path.getmtime(check)
-                    wait = MINIMUM_AGE - age
-                    if wait > 0:
-                        log.info("[%s] [AGE] File too young, waiting %ds...", task.label, int(wait))
-                        time.sleep(wait)
-                else:
-                    log.warning("[%s] [AGE] Path not visible in container: %s", task.label, check)
+def _run_task(task: SyncTask, sync_queue: queue.Queue):
+    """Refresh rclone, check file age, then scan Plex for one due task.
 
-            # Plex scan with retry on timeout
-            plex_instance = get_plex()
-            if plex_instance:
-                for attempt in range(1, 4):
-                    try:
-                        library = plex_instance.library.sectionByID(task.section_id)
-                        log.info("[%s] [SCAN] Attempt %d/3 → %s", task.label, attempt, task.mapped_folder)
-                        library.update(path=task.mapped_folder)
+    A task whose folder is younger than MINIMUM_AGE is rescheduled on the
+    delay queue instead of being recorded in history.
+    """
+    start = time.monotonic()
+    status = "ok"
+    error_msg = ""
+    deferred = False
+    interrupted = False
 
-                        time.sleep(20)
+    try:
+        # Rclone VFS cache — due tasks still waiting in this section's
+        # queue are refreshed in the same RPC and skip their own later
+        if USE_RCLONE and not task.rclone_done:
+            batch = [task] + _due_for_rclone(sync_queue)
+            # Marked before the RPC, under the lock merges use, so a webhook
+            # merged while it is in flight resets the flag and is refreshed again
+            with _in_flight_lock:
+                for t in batch:
+                    t.rclone_done = True
+            rclone_vfs_refresh([t.rclone_host_path for t in batch], task.label)
+
+        # Minimum file age check
+        if MINIMUM_AGE > 0 and not task.aged:
+            # One stat() instead of exists() + getmtime() — each is a
+            # round trip on FUSE/rclone mounts
+            try:
+                mtime = os.stat(task.age_check_path).st_mtime
+            except OSError:
+                mtime = None
+                log.warning("[%s] [AGE] Path not visible in container: %s",
+                            task.label, task.age_check_path)
+            if mtime is not None:
+                wait = MINIMUM_AGE - (time.time() - mtime)
+                if wait > 0:
+                    log.info("[%s] [AGE] File too young, deferring %ds...", task.label, int(wait))
+                    task.aged = True
+                    deferred = True
+                    return
+
+        # Plex scan with retry on timeout
+        plex_instance = get_plex()
+        if plex_instance:
+            for attempt in range(1, 4):
+                try:
+                    library = get_section(plex_instance, task.section_id)
+                    log.info("[%s] [SCAN] Attempt %d/3 → %s", task.label, attempt, task.mapped_folder)
+                    if DEEP_ANALYZE:
+                        # Only alerts raised after this scan should wake the lookup
+                        scan_event(task.section_id).clear()
+                    library.update(path=task.mapped_folder)
+
+                    if DEEP_ANALYZE:
                         item = _find_plex_item(plex_instance, library, task)
-
+                        if not _worker_alive.is_set():
+                            interrupted = True
+                            return
                         if item:
                             log.info("[%s] [METADATA] Found '%s', analyzing...", task.label, item.title)
                             item.analyze()
                         else:
                             log.warning("[%s] [METADATA] Item not found in library DB.", task.label)
-                        break
-
-                    except Exception as exc:
-                        if "timeout" in str(exc).lower() and attempt < 3:
-                            log.warning("[%s] [PLEX] Timeout on attempt %d, retrying in 10s...", task.label, attempt)
-                            # Reconnect in case the connection went stale
-                            invalidate_plex()
-                            plex_instance = get_plex()
-                            time.sleep(10)
-                        else:
-                            raise
+                    break
 
-        except Exception as exc:
-            status = "error"
-            error_msg = str(exc)
-            log.error("[%s] [ERROR] %s", task.label, exc)
-        finally:
+                except Exception as exc:
+                    if "timeout" in str(exc).lower() and attempt < 3:
+                        log.warning("[%s] [PLEX] Timeout on attempt %d, retrying in 10s...", task.label, attempt)
+                        # Reconnect in case the connection went stale
+                        invalidate_plex()
+                        plex_instance = get_plex()
+                        if not _sleep_while_alive(10):
+                            interrupted = True
+                            return
+                    else:
+                        raise
+
+    except Exception as exc:
+        status = "error"
+        error_msg = str(exc)
+        log.error("[%s] [ERROR] %s", task.label, exc)
+    finally:
+        if deferred:
+            _schedule_task(task, time.monotonic() + wait)
+        elif interrupted:
+            # Still journalled in task_store, so it is re-queued on next start
+            log.info("[%s] [SHUTDOWN] Not finished, kept for next start: %s",
+                     task.label, task.mapped_folder)
+        else:
+            # Journal delete stays under the lock so it can't erase the row of
+            # a new task queued for the same folder right after the pop
             with _in_flight_lock:
                 _in_flight.pop(task.mapped_folder, None)
+                task_store.remove(task.mapped_folder)
                 if SYNC_COOLDOWN > 0:
                     _cooldown[task.mapped_folder] = time.monotonic() + SYNC_COOLDOWN
 
             duration = round(time.monotonic() - start, 1)
             history.add({
-                "ts": now_local().isoformat(),
                 "label": task.label,
                 "path": task.mapped_folder,
                 "status": status,
@@ -845,9 +1219,109 @@ def sync_worker():
                 "custom_formats": task.custom_formats,
                 "quality_profile": task.quality_profile,
             })
-            sync_queue.task_done()
+        sync_queue.task_done()
+
+
+def _drain_section(section_id: str, sync_queue: queue.Queue):
+    """Executor job: process one section's queue until it is empty.
+
+    At most one drain job runs per section, so scans within a library stay
+    serialised while different libraries share the SYNC_CONCURRENCY pool.
+    """
+    while _worker_alive.is_set():
+        with _section_queues_lock:
+            try:
+                task: SyncTask = sync_queue.get_nowait()
+            except queue.Empty:
+                _draining.discard(section_id)
+                return
+
+        try:
+            _run_task(task, sync_queue)
+        except Exception as exc:
+            log.error("[%s] [ERROR] Unhandled error in sync task: %s", task.label, exc)
+
+
+def _enqueue_task(task: SyncTask):
+    """Queue a due task on its section and make sure a drain job is running."""
+    with _section_queues_lock:
+        q = _section_queues.get(task.section_id)
+        if q is None:
+            q = _section_queues[task.section_id] = queue.Queue()
+        q.put(task)
+        if task.section_id not in _draining:
+            _draining.add(task.section_id)
+            _executor.submit(_drain_section, task.section_id, q)
+
 
-    log.info("Sync worker stopped")
+# A folder that keeps receiving webhooks is still scanned within this many
+# multiples of WEBHOOK_DELAY after its first one
+_DEBOUNCE_MAX = 4
+
+
+def _schedule_task(task: SyncTask, ready_at: float):
+    """Put a task on the delay queue to be handed to its section at ready_at."""
+    with _delay_cond:
+        task.ready_at = ready_at
+        _delayed[task.mapped_folder] = task
+        heapq.heappush(_delay_heap, (ready_at, next(_delay_seq), task))
+        _delay_cond.notify()
+
+
+def _postpone_task(task: SyncTask) -> bool:
+    """Debounce: push a still-delayed task back to now + WEBHOOK_DELAY.
+
+    Never moves the due time earlier (e.g. during a MINIMUM_AGE deferral).
+    Returns False if the task has already left the delay queue.
+    """
+    with _delay_cond:
+        if _delayed.get(task.mapped_folder) is not task:
+            return False
+        ready_at = min(time.monotonic() + WEBHOOK_DELAY,
+                       task.queued_at + WEBHOOK_DELAY * _DEBOUNCE_MAX)
+        if ready_at > task.ready_at:
+            task.ready_at = ready_at
+            # The superseded entry stays in the heap and is skipped on pop
+            heapq.heappush(_delay_heap, (ready_at, next(_delay_seq), task))
+        return True
+
+
+def _delay_dispatcher():
+    """Background thread: move tasks from the delay queue to their section queue once due."""
+    while _worker_alive.is_set():
+        due = []
+        with _delay_cond:
+            now = time.monotonic()
+            while _delay_heap and _delay_heap[0][0] <= now:
+                ready_at, _, task = heapq.heappop(_delay_heap)
+                if task.ready_at == ready_at and _delayed.get(task.mapped_folder) is task:
+                    del _delayed[task.mapped_folder]
+                    due.append(task)
+            if not due:
+                _delay_cond.wait(_delay_heap[0][0] - now if _delay_heap else None)
+                continue
+        for task in due:
+            _enqueue_task(task)
+
+
+def _restore_pending_tasks():
+    """Re-queue tasks journalled by a previous run that never finished."""
+    rows = task_store.load_all()
+    for row in rows:
+        task = SyncTask(**row)
+        with _in_flight_lock:
+            _in_flight[task.mapped_folder] = task
+        _schedule_task(task, task.queued_at + WEBHOOK_DELAY)
+    if rows:
+        log.info("Restored %d pending sync task(s) from previous run", len(rows))
+
+
+def _queue_depth() -> int:
+    """Total number of tasks waiting, delayed or due, across all sections."""
+    with _delay_cond:
+        delayed = len(_delayed)
+    with _section_queues_lock:
+        return delayed + sum(q.qsize() for q in _section_queues.values())
 
 
 def custom_format_refresh_scheduler() -> None:
@@ -903,37 +1377,51 @@ def invite_expiry_scheduler() -> None:
     log.info("Invite expiry scheduler stopped")
 
 
+# Maximum seconds to wait before each metadata lookup attempt. The first probe
+# runs almost immediately (Plex usually indexes a single folder within a second
+# or two); later probes back off exponentially, capped at 32s (~95s worst case).
+# A Plex alert for the section (see _on_plex_alert) cuts any wait short.
+_LOOKUP_BACKOFF = (1, 2, 4, 8, 16, 32, 32)
+
+
 def _find_plex_item(plex_instance, library, task: SyncTask):
-    """Try to locate the newly-scanned item in Plex via path query then title search."""
-    search_path = task.mapped_folder.rstrip('/')
-    folder_name = os.path.basename(search_path)
-    clean_title = re.sub(r'\s*[\(\{\[].*', '', folder_name).strip()
+    """Try to locate the newly-scanned item in Plex via path query then title search.
 
-    for i in range(6):
-        log.info("[%s] [METADATA] Lookup %d/6 for '%s'", task.label, i + 1, clean_title)
+    Polls with exponential backoff (see _LOOKUP_BACKOFF), waking early when
+    Plex reports indexing activity in the section, and returns as soon as the
+    item is found, or None once all attempts are exhausted.
+    """
+    search_path = task.search_path
+    clean_title = task.clean_title
+    section_all = f"/library/sections/{task.section_id}/all"
+    path_params = {'path': search_path}
+    attempts = len(_LOOKUP_BACKOFF)
+    event = scan_event(task.section_id)
+
+    for i, delay in enumerate(_LOOKUP_BACKOFF):
+        if event.wait(delay):
+            event.clear()
+        if not _worker_alive.is_set():
+            return None
+        log.info("[%s] [METADATA] Lookup %d/%d for '%s'", task.label, i + 1, attempts, clean_title)
         try:
-            encoded = urllib.parse.quote(search_path)
-            xml = plex_instance.query(f"/library/sections/{task.section_id}/all?path={encoded}")
-            container = MediaContainer(plex_instance, xml)
-            if container.metadata:
-                return container.metadata[0]
+            items = plex_instance.fetchItems(section_all, params=path_params, maxresults=1)
+            if items:
+                return items[0]
         except Exception as exc:
             if "timeout" in str(exc).lower():
                 raise
 
-        # Fallback: title search + path match
+        # Fallback: title search + path match. Search results already carry
+        # Location (shows) or Media/Part (movies) data, so .locations needs
+        # no further request per result.
         try:
             for res in library.search(title=clean_title):
-                locs = res.locations if hasattr(res, 'locations') else []
-                if not locs and hasattr(res, 'media'):
-                    locs = [p.file for m in res.media for p in m.parts]
-                if any(search_path in loc for loc in locs):
+                if any(search_path in loc for loc in getattr(res, 'locations', ())):
                     return res
         except Exception:
             pass
 
-        time.sleep(20)
-
     return None
 
 
@@ -957,13 +1445,13 @@ def _merge_episode_counts(existing: str, incoming: str) -> str:
                 return parsed, len(parsed)
         except (json.JSONDecodeError, ValueError):
             pass
-        m = re.match(r'^(\d+) episodes?$', ep.strip())
+        m = _EP_COUNT_RE.match(ep.strip())
         if m:
             return [], int(m.group(1))
         return [ep], 1  # single filename
 
     def _ep_key(ep: str):
-        m = re.search(r'[Ss](\d+)[Ee](\d+)', ep)
+        m = _EP_KEY_RE.search(ep)
         return f"S{int(m.group(1)):02d}E{int(m.group(2)):02d}" if m else None
 
     existing_names, existing_count = _to_list(existing)
@@ -1061,7 +1549,7 @@ def _merge_custom_formats(existing: str, incoming: str) -> str:
 
 
 def enqueue_sync(raw_path: str, label: str, episode: str = "",
-                 quality: str = "", custom_formats: str = "", quality_profile: str = ""):
+                 quality: str = "", custom_formats: str = ""):
     """Validate, map, and enqueue a sync task. Returns (response_dict, http_status)."""
     if not raw_path:
         return {"status": "skipped", "reason": "empty path"}, 200
@@ -1069,14 +1557,11 @@ def enqueue_sync(raw_path: str, label: str, episode: str = "",
     mapped_folder  = apply_path_mapping(raw_path, PATH_REPLACEMENTS, label, is_dir=True)
     rclone_path    = apply_path_mapping(raw_path, RCLONE_PATH_REPLACEMENTS, label, is_dir=False) \
                      if USE_RCLONE else ""
-    age_check_path = mapped_folder
+    # Stored without the trailing slash — it is only ever passed to os.stat
+    age_check_path = mapped_folder.rstrip('/')
 
     # Section mapping
-    comp = mapped_folder.rstrip('/').lower()
-    section_id = next(
-        (SECTION_MAPPING[p] for p in sorted(SECTION_MAPPING, key=len, reverse=True) if comp.startswith(p)),
-        None
-    )
+    section_id = section_for_folder(mapped_folder)
 
     if not section_id:
         log.warning("[%s] [SKIP] No section mapping for '%s'", label, mapped_folder)
@@ -1092,13 +1577,12 @@ def enqueue_sync(raw_path: str, label: str, episode: str = "",
         episode=episode,
         quality=quality,
         custom_formats=custom_formats,
-        quality_profile=quality_profile,
     )
 
     # Deduplication: if same folder already queued or in cooldown, skip re-queuing
     with _in_flight_lock:
-        if mapped_folder in _in_flight:
-            existing_task = _in_flight[mapped_folder]
+        existing_task = _in_flight.get(mapped_folder)
+        if existing_task:
             if episode:
                 merged = _merge_episode_counts(existing_task.episode, episode)
                 existing_task.episode = merged
@@ -1109,26 +1593,37 @@ def enqueue_sync(raw_path: str, label: str, episode: str = "",
             # Quality: union all distinct values across deduplicated events
             if quality:
                 existing_task.quality = _merge_qualities(existing_task.quality, quality)
-            # Profile: keep first non-empty value (profile is per-series, not per-file)
-            if not existing_task.quality_profile and quality_profile:
-                existing_task.quality_profile = quality_profile
             # Custom formats: union
             if custom_formats:
                 existing_task.custom_formats = _merge_custom_formats(
                     existing_task.custom_formats, custom_formats)
+            # New files may have landed since a batched refresh covered this task
+            existing_task.rclone_done = False
+            _postpone_task(existing_task)
+            # Rewritten under the lock: once this task completes and a new one
+            # is journalled for the folder, a late update would clobber its row
+            task_store.update(existing_task)
             return {"status": "deduplicated"}, 200
-
-        if SYNC_COOLDOWN > 0:
-            _prune_cooldown()
-            expiry = _cooldown.get(mapped_folder, 0)
-            if time.monotonic() < expiry:
-                log.info("[%s] [COOLDOWN] Recently synced, dropping follow-up event: %s", label, mapped_folder)
-                return {"status": "deduplicated"}, 200
-
-        _in_flight[mapped_folder] = task
-
-    sync_queue.put(task)
-    log.info("[%s] [QUEUE] Added (depth=%d): %s", label, sync_queue.qsize(), mapped_folder)
+        else:
+            if SYNC_COOLDOWN > 0:
+                _prune_cooldown()
+                expiry = _cooldown.get(mapped_folder, 0)
+                if time.monotonic() < expiry:
+                    log.info("[%s] [COOLDOWN] Recently synced, dropping follow-up event: %s", label, mapped_folder)
+                    return {"status": "deduplicated"}, 200
+
+            if len(_in_flight) >= QUEUE_MAX:
+                log.warning("[%s] [QUEUE] Full (%d tasks), rejecting: %s", label, QUEUE_MAX, mapped_folder)
+                return {"status": "busy", "reason": "queue full"}, 503
+
+            _in_flight[mapped_folder] = task
+
+    # Saved outside the lock so new webhooks don't serialise on SQLite I/O;
+    # the task isn't scheduled yet, so it can't complete before this write
+    task_store.save(task)
+    _schedule_task(task, task.queued_at + WEBHOOK_DELAY)
+    log.info("[%s] [QUEUE] Added to section %s, due in %ds: %s",
+             label, section_id, WEBHOOK_DELAY, mapped_folder)
     return {"status": "queued"}, 200
 
 
@@ -1168,7 +1663,6 @@ def process_webhook(data: dict, instance_type: str):
     raw_path = ""
     episode = ""
     quality = ""
-    custom_formats_list: list = []
 
     if 'movie' in data:
         raw_path = data['movie'].get('folderPath', '')
@@ -1253,53 +1747,98 @@ def process_webhook(data: dict, instance_type: str):
     log.info("[%s] Raw webhook fields — episodeFile/movieFile.quality=%r  top-level customFormats=%r",
              label, _raw_qual, _raw_cf)
 
-    # Resolve the file ID so we can query the arr API for accurate custom formats.
-    # Webhooks sometimes omit customFormats or only include a subset; the
-    # /episodefile/{id} and /moviefile/{id} endpoints always return the full
-    # evaluated list for that file.
-    _file_id = 0
-    if data.get('movieFile'):
-        _file_id = data['movieFile'].get('id', 0)
-    elif data.get('episodeFile'):
-        _file_id = data['episodeFile'].get('id', 0)
-    elif data.get('episodeFiles'):
-        _file_id = data['episodeFiles'][0].get('id', 0)
-    elif data.get('renamedEpisodeFiles'):
-        _file_id = data['renamedEpisodeFiles'][0].get('id', 0)
-
-    api_cf = _fetch_custom_formats_for_file(instance_type, _file_id)
-    if api_cf:
-        custom_formats_list = api_cf
-    else:
-        # Fall back to whatever the webhook included (may be empty or partial)
-        for cf in data.get('customFormats', []):
-            if isinstance(cf, dict):
-                name = cf.get('name', '')
-            elif isinstance(cf, str):
-                name = cf
-            else:
-                name = ''
-            if name and name not in custom_formats_list:
-                custom_formats_list.append(name)
+    # Custom formats the webhook included (may be empty or partial); the
+    # arr API lookup below replaces/extends these with the full list.
+    custom_formats_list: list = []
+    for cf in data.get('customFormats', []):
+        if isinstance(cf, dict):
+            name = cf.get('name', '')
+        elif isinstance(cf, str):
+            name = cf
+        else:
+            name = ''
+        if name and name not in custom_formats_list:
+            custom_formats_list.append(name)
 
     if quality or custom_formats_list:
         log.info("[%s] Captured quality=%r custom_formats=%r", label, quality, custom_formats_list)
 
-    # Quality profile — not present in the webhook payload; requires an API round-trip.
-    item_id = 0
-    if 'movie' in data:
-        item_id = data['movie'].get('id', 0)
-    elif 'series' in data:
-        item_id = data['series'].get('id', 0)
-    quality_profile = _get_quality_profile_name(instance_type, item_id)
-
+    # Queue (and journal) the task before answering, so an accepted webhook
+    # is never lost to a restart.
     custom_formats = json.dumps(custom_formats_list) if custom_formats_list else ""
     result, status = enqueue_sync(raw_path, label, episode=episode,
-                                  quality=quality, custom_formats=custom_formats,
-                                  quality_profile=quality_profile)
+                                  quality=quality, custom_formats=custom_formats)
+
+    # The arr API lookups can take seconds, so they run on the ingest pool and
+    # are merged into the queued task afterwards. Each pending job holds a slot;
+    # when none are free the task is simply synced without the extra metadata.
+    arr_url = SONARR_URL if instance_type == "sonarr" else RADARR_URL
+    arr_key = SONARR_API_KEY if instance_type == "sonarr" else RADARR_API_KEY
+    if result["status"] in ("queued", "deduplicated") and arr_url and arr_key:
+        if not _ingest_slots.acquire(blocking=False):
+            log.warning("[%s] Ingest backlog full, skipping arr API lookup for %s", label, raw_path)
+        else:
+            try:
+                _ingest_executor.submit(_enrich_task, data, instance_type, label, raw_path)
+            except RuntimeError:
+                # Pool already shut down — the task is journalled, just skip the lookup
+                _ingest_slots.release()
+                log.warning("[%s] Shutting down, skipping arr API lookup for %s", label, raw_path)
+
     return jsonify(result), status
 
 
+def _enrich_task(data: dict, instance_type: str, label: str, raw_path: str):
+    """Ingest pool job: fetch custom formats and quality profile from the arr
+    API and merge them into the task queued for raw_path."""
+    try:
+        # Resolve the file ID so we can query the arr API for accurate custom formats.
+        # Webhooks sometimes omit customFormats or only include a subset; the
+        # /episodefile/{id} and /moviefile/{id} endpoints always return the full
+        # evaluated list for that file.
+        _file_id = 0
+        if data.get('movieFile'):
+            _file_id = data['movieFile'].get('id', 0)
+        elif data.get('episodeFile'):
+            _file_id = data['episodeFile'].get('id', 0)
+        elif data.get('episodeFiles'):
+            _file_id = data['episodeFiles'][0].get('id', 0)
+        elif data.get('renamedEpisodeFiles'):
+            _file_id = data['renamedEpisodeFiles'][0].get('id', 0)
+        api_cf = _fetch_custom_formats_for_file(instance_type, _file_id)
+
+        # Quality profile — not present in the webhook payload; requires an API round-trip.
+        item_id = 0
+        if 'movie' in data:
+            item_id = data['movie'].get('id', 0)
+        elif 'series' in data:
+            item_id = data['series'].get('id', 0)
+        quality_profile = _get_quality_profile_name(instance_type, item_id)
+
+        if not api_cf and not quality_profile:
+            return
+        mapped_folder = apply_path_mapping(raw_path, PATH_REPLACEMENTS, label, is_dir=True)
+        with _in_flight_lock:
+            task = _in_flight.get(mapped_folder)
+            if task is None:
+                log.debug("[%s] Task for %s already finished, dropping arr API metadata",
+                          label, mapped_folder)
+                return
+            if api_cf:
+                task.custom_formats = _merge_custom_formats(task.custom_formats, json.dumps(api_cf))
+            # Profile: keep first non-empty value (profile is per-series, not per-file)
+            if quality_profile and not task.quality_profile:
+                task.quality_profile = quality_profile
+            # Under the lock for the same reason as the enqueue_sync merge path
+            task_store.update(task)
+        log.info("[%s] Captured from API custom_formats=%r quality_profile=%r",
+                 label, api_cf, quality_profile)
+    except Exception as exc:
+        log.error("[%s] [ERROR] arr API lookup failed for %s: %s", label, raw_path, exc)
+    finally:
+        _ingest_slots.release()
+
+
 # ---------------------------------------------------------------------------
 # Demo mode — fake data for screenshots / public demos
 # ---------------------------------------------------------------------------
@@ -1441,16 +1980,35 @@ def _demo_history() -> list:
 # Routes
 # ---------------------------------------------------------------------------
 
+# Bodies below this size that mention "Test" are connection-test pings
+_TEST_PING_MAX_BYTES = 200
+
+
+def _receive_webhook(instance_type: str):
+    """Answer tiny Test pings without parsing JSON, otherwise parse and hand off to process_webhook."""
+    length = request.content_length
+    if length and length < _TEST_PING_MAX_BYTES and b'"Test"' in request.get_data(cache=True):
+        log.info("[%s] Test webhook received", instance_type.upper())
+        return jsonify({"status": "test_success"}), 200
+    # Parse the raw body with _json_loads (orjson when installed) — arr
+    # payloads carry full series/movie metadata and arrive in bursts
+    try:
+        data = _json_loads(request.get_data() or b'{}')
+    except ValueError:
+        return jsonify({"error": "Invalid JSON"}), 400
+    return process_webhook(data if isinstance(data, dict) else {}, instance_type)
+
+
 @app.route('/webhook/sonarr', methods=['POST'])
 @csrf.exempt
 def webhook_sonarr():
-    return process_webhook(request.get_json(silent=True) or {}, "sonarr")
+    return _receive_webhook("sonarr")
 
 
 @app.route('/webhook/radarr', methods=['POST'])
 @csrf.exempt
 def webhook_radarr():
-    return process_webhook(request.get_json(silent=True) or {}, "radarr")
+    return _receive_webhook("radarr")
 
 
 @app.route('/login/demo')
@@ -1641,14 +2199,15 @@ def now_playing():
 
 @app.route('/health', methods=['GET'])
 def health():
-    plex_ok = get_plex() is not None
+    # Connection state only — _plex_connect_loop does the (re)connecting
+    plex_ok = _plex is not None
     return jsonify({
         "status": "ok" if plex_ok else "degraded",
         "plex_connected": plex_ok,
         "rclone_enabled": USE_RCLONE,
-        "queue_depth": sync_queue.qsize(),
+        "queue_depth": _queue_depth(),
         "worker_alive": _worker_alive.is_set(),
-        "recent_history": history.as_list()[:10],
+        "recent_history": history.get_recent(limit=10),
     }), 200 if plex_ok else 207
 
 
@@ -1682,7 +2241,7 @@ def api_stats():
             "avg_duration_s": stats["avg_duration_s"],
         },
         "queue": {
-            "depth":     sync_queue.qsize(),
+            "depth":     _queue_depth(),
             "in_flight": in_flight_count,
         },
         "worker": {
@@ -2232,6 +2791,16 @@ def accept_invite(token):
 def _handle_shutdown(signum, frame):
     log.info("Shutdown signal received, stopping worker...")
     _worker_alive.clear()
+    # Wake post-scan lookups waiting on a Plex alert so they see the shutdown
+    with _scan_events_lock:
+        for event in _scan_events.values():
+            event.set()
+    # Drop drain jobs that haven't started; their tasks (and any still on the
+    # delay queue) stay in the queue journal and are restored on the next
+    # start. Interrupted tasks are left in the journal too.
+    _executor.shutdown(wait=False, cancel_futures=True)
+    # Pending arr API lookups only add badges to already-journalled tasks
+    _ingest_executor.shutdown(wait=False, cancel_futures=True)
     sys.exit(0)
 
 
@@ -2260,8 +2829,12 @@ if __name__ == '__main__':
     log.info("Radarr API: %s", RADARR_URL if RADARR_URL and RADARR_API_KEY else "NOT CONFIGURED (set RADARR_URL + RADARR_API_KEY for quality-profile badges)")
     _log_env()
 
-    worker_thread = threading.Thread(target=sync_worker, daemon=True, name="sync-worker")
-    worker_thread.start()
+    # Section drain jobs are submitted to _executor on demand by _enqueue_task()
+    _restore_pending_tasks()
+    delay_thread = threading.Thread(target=_delay_dispatcher, daemon=True, name="delay-dispatcher")
+    delay_thread.start()
+    plex_thread = threading.Thread(target=_plex_connect_loop, daemon=True, name="plex-connect")
+    plex_thread.start()
 
     cf_thread = threading.Thread(target=custom_format_refresh_scheduler, daemon=True, name="cf-scheduler")
     cf_thread.start()
@@ -2269,5 +2842,5 @@ if __name__ == '__main__':
     invite_thread = threading.Thread(target=invite_expiry_scheduler, daemon=True, name="invite-expiry")
     invite_thread.start()
 
-    log.info("Webhook receiver active on port %d", PORT)
-    serve(app, host='0.0.0.0', port=PORT, asyncore_use_poll=True)
+    log.info("Webhook receiver active on port %d (%d threads)", PORT, WEB_THREADS)
+    serve(app, host='0.0.0.0', port=PORT, threads=WEB_THREADS, asyncore_use_poll=True)